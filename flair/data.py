@@ -679,6 +679,9 @@ class Sentence(DataPoint):
         # private field for all known spans
         self._known_spans: Dict[str, _PartOfSentence] = {}
 
+        # private field for relation candidates cached by the RelationExtractor, together with their cache key
+        self._relation_candidates: Optional[typing.Tuple[typing.Hashable, List[Relation]]] = None
+
         self.language_code: Optional[str] = language_code
 
         self.start_pos = start_position
@@ -1090,7 +1093,12 @@ class Sentence(DataPoint):
             span.remove_labels(typename)
 
         # remove spans without labels
-        self._known_spans = {k: v for k, v in self._known_spans.items() if len(v.labels) > 0}
+        known_spans = {k: v for k, v in self._known_spans.items() if len(v.labels) > 0}
+
+        # cached relation candidates may refer to removed relations, so they need to be rebuilt
+        if len(known_spans) < len(self._known_spans):
+            self._relation_candidates = None
+        self._known_spans = known_spans
 
         # delete labels at object itself
         super().remove_labels(typename)
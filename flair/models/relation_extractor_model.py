@@ -1,18 +1,23 @@
+import itertools
 import logging
 from pathlib import Path
-from typing import List, Optional, Set, Tuple
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
 
 import torch
 
 import flair.embeddings
 import flair.nn
-from flair.data import Relation, Sentence
+from flair.data import Relation, Sentence, Span
 from flair.embeddings import Embeddings
 from flair.file_utils import cached_path
 
 log = logging.getLogger("flair")
 
 
+def _pair_key(first: Span, second: Span) -> Tuple[int, int, int, int]:
+    return first.tokens[0].idx, first.tokens[-1].idx, second.tokens[0].idx, second.tokens[-1].idx
+
+
 class RelationExtractor(flair.nn.DefaultClassifier[Sentence, Relation]):
     def __init__(
         self,
@@ -51,36 +56,77 @@ class RelationExtractor(flair.nn.DefaultClassifier[Sentence, Relation]):
 
         # whether to use gold entity pairs, and whether to filter entity pairs by type
         if entity_pair_filters is not None:
-            self.entity_pair_filters: Optional[Set[Tuple[str, str]]] = set(entity_pair_filters)
+            self.entity_pair_filters: Optional[FrozenSet[Tuple[str, str]]] = frozenset(entity_pair_filters)
         else:
             self.entity_pair_filters = None
 
         self.to(flair.device)
 
-    def _get_valid_relations(self, sentence: Sentence) -> List[Relation]:
+    def _get_valid_relations(
+        self,
+        entity_spans: List[Span],
+        entity_tags: List[str],
+        gold_relations: Dict[Tuple[int, int, int, int], Relation],
+        previous_relations: List[Relation],
+    ) -> List[Relation]:
+        # when training on gold pairs only, the candidates are a subset of the gold relations
+        if self.training and self.train_on_gold_pairs_only:
+            entities = {
+                (span.tokens[0].idx, span.tokens[-1].idx): (span, tag) for span, tag in zip(entity_spans, entity_tags)
+            }
+            return self._get_valid_gold_relations(entities, gold_relations)
+
+        # reuse the relations of previous candidates, so that Relation objects are only created for new pairs (the
+        # sentence discards its cached candidates when it drops relations, so these are still known to the sentence)
+        known_relations = {
+            _pair_key(relation.first, relation.second): relation
+            for relation in itertools.chain(previous_relations, gold_relations.values())
+        }
+
         entity_pairs = []
-        entity_spans = sentence.get_spans(self.entity_label_type)
+        entity_pair_filters = self.entity_pair_filters
+
+        # all ordered pairs of two different entities, in the same order as a nested loop
+        for (span_1, tag_1), (span_2, tag_2) in itertools.permutations(zip(entity_spans, entity_tags), 2):
 
-        for span_1 in entity_spans:
-            for span_2 in entity_spans:
-                if span_1 == span_2:
-                    continue
-
-                # filter entity pairs according to their tags if set
-                if (
-                    self.entity_pair_filters is not None
-                    and (
-                        span_1.get_label(self.entity_label_type).value,
-                        span_2.get_label(self.entity_label_type).value,
-                    )
-                    not in self.entity_pair_filters
-                ):
-                    continue
+            # filter entity pairs according to their tags if set
+            if entity_pair_filters is not None and (tag_1, tag_2) not in entity_pair_filters:
+                continue
 
+            relation = known_relations.get(_pair_key(span_1, span_2))
+            if relation is None:
                 relation = Relation(span_1, span_2)
-                if self.training and self.train_on_gold_pairs_only and relation.get_label(self.label_type).value == "O":
-                    continue
-                entity_pairs.append(relation)
+            entity_pairs.append(relation)
+        return entity_pairs
+
+    def _get_valid_gold_relations(
+        self,
+        entities: Dict[Tuple[int, int], Tuple[Span, str]],
+        gold_relations: Dict[Tuple[int, int, int, int], Relation],
+    ) -> List[Relation]:
+        entity_pairs = []
+        entity_pair_filters = self.entity_pair_filters
+        label_type = self.label_type
+
+        for key, relation in gold_relations.items():
+            # skip relations of a span with itself
+            if key[:2] == key[2:]:
+                continue
+
+            # skip relations that do not connect two current entities of the sentence
+            first = entities.get(key[:2])
+            second = entities.get(key[2:])
+            if first is None or second is None:
+                continue
+            (span_1, tag_1), (span_2, tag_2) = first, second
+
+            # filter entity pairs according to their tags if set
+            if entity_pair_filters is not None and (tag_1, tag_2) not in entity_pair_filters:
+                continue
+
+            if relation.get_label(label_type).value == "O":
+                continue
+            entity_pairs.append(relation)
         return entity_pairs
 
     @property
@@ -91,27 +137,108 @@ class RelationExtractor(flair.nn.DefaultClassifier[Sentence, Relation]):
         entity_pairs: List[Relation] = []
 
         for sentence in sentences:
-            entity_pairs.extend(self._get_valid_relations(sentence))
+            entity_pairs.extend(self._get_cached_relations(sentence))
         return entity_pairs
 
-    def _embed_prediction_data_point(self, prediction_data_point: Relation) -> torch.Tensor:
-        span_1 = prediction_data_point.first
-        span_2 = prediction_data_point.second
-        embedding_names = self.embeddings.get_names()
+    def _get_cached_relations(self, sentence: Sentence) -> List[Relation]:
+        # the candidate pairs only change if the entities (or, when training on gold pairs only, the gold relations)
+        # of the sentence change, so they are built once and reused as long as the cache key matches. The sentence
+        # resets its cached candidates whenever it drops relations, so a matching key is checked once per sentence
+        entity_spans = sentence.get_spans(self.entity_label_type)
 
-        if self.pooling_operation == "first_last":
-            return torch.cat(
-                [
-                    span_1.tokens[0].get_embedding(embedding_names),
-                    span_1.tokens[-1].get_embedding(embedding_names),
-                    span_2.tokens[0].get_embedding(embedding_names),
-                    span_2.tokens[-1].get_embedding(embedding_names),
-                ]
+        # look up the tag of each entity once instead of once per pair
+        entity_tags = [span.get_label(self.entity_label_type).value for span in entity_spans]
+
+        # look up existing relations by their token boundaries instead of their string identifier
+        gold_relations = {
+            _pair_key(relation.first, relation.second): relation for relation in sentence.get_relations(self.label_type)
+        }
+
+        cache_key = self._relation_cache_key(entity_spans, entity_tags, gold_relations)
+        previous_relations: List[Relation] = []
+        cached_candidates = getattr(sentence, "_relation_candidates", None)
+        if cached_candidates is not None:
+            previous_key, previous_relations = cached_candidates
+            if previous_key == cache_key:
+                return previous_relations
+
+        relations = self._get_valid_relations(entity_spans, entity_tags, gold_relations, previous_relations)
+        sentence._relation_candidates = (cache_key, relations)
+        return relations
+
+    def _relation_cache_key(
+        self,
+        entity_spans: List[Span],
+        entity_tags: List[str],
+        gold_relations: Dict[Tuple[int, int, int, int], Relation],
+    ) -> Hashable:
+        entity_key = tuple(
+            (span.tokens[0].idx, span.tokens[-1].idx, tag) for span, tag in zip(entity_spans, entity_tags)
+        )
+
+        gold_key = None
+        if self.training and self.train_on_gold_pairs_only:
+            gold_key = tuple(
+                (key, relation.get_label(self.label_type).value) for key, relation in gold_relations.items()
             )
+
+        return self.entity_label_type, self.label_type, self.entity_pair_filters, gold_key, entity_key
+
+    def _prepare_tensors(self, sentences: List[Sentence]) -> Tuple[torch.Tensor, ...]:
+        sentences = [sentence for sentence in sentences if self._filter_data_point(sentence)]
+
+        # collect the boundary token positions of all pairs, offset by the tokens of the preceding sentences
+        sentences_with_relations: List[Sentence] = []
+        indices: List[List[int]] = []
+        offset = 0
+        for sentence in sentences:
+            relations = self._get_cached_relations(sentence)
+            if not relations:
+                continue
+
+            sentences_with_relations.append(sentence)
+            indices.extend([offset + index for index in self._get_token_indices(relation)] for relation in relations)
+            offset += len(sentence)
+
+        if not indices:
+            return (torch.zeros(0, self.final_embedding_size, device=flair.device),)
+
+        # only sentences that contain candidate pairs need to be embedded
+        self.embeddings.embed(sentences_with_relations)
+
+        # gather the embeddings of all pairs in the batch with a single index_select
+        token_embeddings = self._get_token_embedding_matrix(sentences_with_relations)
+        assert token_embeddings.size(0) == offset, "every token needs to be embedded to gather relation embeddings"
+        index_tensor = torch.tensor(indices, dtype=torch.long, device=flair.device)
+        embedded_entity_pairs = token_embeddings.index_select(0, index_tensor.view(-1)).view(len(indices), -1)
+
+        return (embedded_entity_pairs,)
+
+    def _get_token_embedding_matrix(self, sentences: List[Sentence]) -> torch.Tensor:
+        # concatenate all embeddings of all tokens at once instead of calling get_embedding() per token
+        names = self.embeddings.get_names()
+        all_embs = [emb for sentence in sentences for token in sentence for emb in token.get_each_embedding(names)]
+        return torch.cat(all_embs).view(-1, self.embeddings.embedding_length)
+
+    def _get_token_indices(self, relation: Relation) -> List[int]:
+        # token indices are 1-based
+        if self.pooling_operation == "first_last":
+            return [
+                relation.first.tokens[0].idx - 1,
+                relation.first.tokens[-1].idx - 1,
+                relation.second.tokens[0].idx - 1,
+                relation.second.tokens[-1].idx - 1,
+            ]
         else:
-            return torch.cat(
-                [span_1.tokens[0].get_embedding(embedding_names), span_2.tokens[0].get_embedding(embedding_names)]
-            )
+            return [relation.first.tokens[0].idx - 1, relation.second.tokens[0].idx - 1]
+
+    def _embed_prediction_data_point(self, prediction_data_point: Relation) -> torch.Tensor:
+        # batches are embedded in _prepare_tensors, this is only kept to embed single relations
+        tokens = prediction_data_point.sentence.tokens
+        embedding_names = self.embeddings.get_names()
+        return torch.cat(
+            [tokens[index].get_embedding(embedding_names) for index in self._get_token_indices(prediction_data_point)]
+        )
 
     def _print_predictions(self, batch, gold_label_type):
         lines = []
@@ -16,7 +16,10 @@ class LockedDropout(torch.nn.Module):
         if not self.training or not self.dropout_rate:
             return x
 
-        if not self.batch_first:
+        if x.dim() == 2:
+            # a single step per batch element, so there is no sequence dimension to share the mask across
+            m = x.data.new(x.size(0), x.size(1)).bernoulli_(1 - self.dropout_rate)
+        elif not self.batch_first:
             m = x.data.new(1, x.size(1), x.size(2)).bernoulli_(1 - self.dropout_rate)
         else:
             m = x.data.new(x.size(0), 1, x.size(2)).bernoulli_(1 - self.dropout_rate)
@@ -44,7 +47,7 @@ class WordDropout(torch.nn.Module):
         if not self.training or not self.dropout_rate:
             return x
 
-        m = x.data.new(x.size(0), x.size(1), 1).bernoulli_(1 - self.dropout_rate)
+        m = x.data.new(*x.shape[:-1], 1).bernoulli_(1 - self.dropout_rate)
 
         mask = torch.autograd.Variable(m, requires_grad=False)
         return mask * x
@@ -621,11 +621,14 @@ class DefaultClassifier(Classifier[DT], typing.Generic[DT, DT2]):
 
     def forward(self, *args: torch.Tensor) -> torch.Tensor:
         emb = self._transform_embeddings(*args)
-        emb = emb.unsqueeze(1)
-        emb = self.dropout(emb)
-        emb = self.locked_dropout(emb)
-        emb = self.word_dropout(emb)
-        emb = emb.squeeze(1)
+
+        # only apply dropouts that are enabled
+        if self.dropout.p:
+            emb = self.dropout(emb)
+        if self.locked_dropout.dropout_rate:
+            emb = self.locked_dropout(emb)
+        if self.word_dropout.dropout_rate:
+            emb = self.word_dropout(emb)
 
         if self.inverse_model:
             emb = self.gradient_reversal(emb)
@@ -0,0 +1,63 @@
+import torch
+
+from flair.nn import LockedDropout, WordDropout
+
+
+def test_locked_dropout_2d_uses_one_mask_value_per_element():
+    dropout = LockedDropout(0.5)
+    x = torch.rand(4, 6)
+
+    torch.manual_seed(1)
+    result = dropout(x)
+
+    torch.manual_seed(1)
+    mask = torch.ones(4, 6).bernoulli_(0.5) / 0.5
+    assert result.shape == (4, 6)
+    assert torch.equal(result, mask * x)
+
+
+def test_locked_dropout_3d_is_unchanged():
+    x = torch.rand(4, 5, 6)
+
+    torch.manual_seed(1)
+    result = LockedDropout(0.5)(x)
+    torch.manual_seed(1)
+    mask = torch.ones(4, 1, 6).bernoulli_(0.5) / 0.5
+    assert torch.equal(result, mask.expand_as(x) * x)
+
+    torch.manual_seed(1)
+    result = LockedDropout(0.5, batch_first=False)(x)
+    torch.manual_seed(1)
+    mask = torch.ones(1, 5, 6).bernoulli_(0.5) / 0.5
+    assert torch.equal(result, mask.expand_as(x) * x)
+
+
+def test_word_dropout_2d_drops_whole_rows():
+    dropout = WordDropout(0.5)
+    x = torch.rand(4, 6)
+
+    torch.manual_seed(1)
+    result = dropout(x)
+
+    torch.manual_seed(1)
+    mask = torch.ones(4, 1).bernoulli_(0.5)
+    assert result.shape == (4, 6)
+    assert torch.equal(result, mask * x)
+
+
+def test_word_dropout_3d_is_unchanged():
+    dropout = WordDropout(0.5)
+    x = torch.rand(4, 5, 6)
+
+    torch.manual_seed(1)
+    result = dropout(x)
+
+    torch.manual_seed(1)
+    mask = torch.ones(4, 5, 1).bernoulli_(0.5)
+    assert torch.equal(result, mask * x)
+
+
+def test_dropouts_are_identity_in_eval_mode():
+    x = torch.rand(4, 6)
+    assert torch.equal(LockedDropout(0.5).eval()(x), x)
+    assert torch.equal(WordDropout(0.5).eval()(x), x)
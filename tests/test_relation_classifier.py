@@ -1,9 +1,12 @@
+from typing import List
+
 import pytest
+import torch
 
 import flair
-from flair.data import Sentence
+from flair.data import Dictionary, Relation, Sentence
 from flair.datasets import ColumnCorpus
-from flair.embeddings import TransformerWordEmbeddings
+from flair.embeddings import TokenEmbeddings, TransformerWordEmbeddings
 from flair.models import RelationExtractor
 from flair.trainers import ModelTrainer
 
@@ -55,3 +58,183 @@ def test_train_load_use_classifier(results_base_path, tasks_base_path):
     assert "founded_by" == sentence.get_labels("relation")[0].value
 
     del loaded_model
+
+
+class TokenIndexEmbeddings(TokenEmbeddings):
+    """Embeds each token with its index, so that gathered relation embeddings can be traced back to tokens."""
+
+    def __init__(self):
+        super().__init__()
+        self.name = "token-index"
+        self.static_embeddings = False
+
+    @property
+    def embedding_length(self) -> int:
+        return 3
+
+    def _add_embeddings_internal(self, sentences: List[Sentence]) -> List[Sentence]:
+        for sentence in sentences:
+            for token in sentence:
+                token.set_embedding(self.name, torch.full((3,), float(token.idx), device=flair.device))
+        return sentences
+
+
+def make_relation_extractor(**kwargs) -> RelationExtractor:
+    label_dictionary = Dictionary(add_unk=False)
+    for label in ["O", "born_in", "lives_in"]:
+        label_dictionary.add_item(label)
+
+    return RelationExtractor(
+        embeddings=TokenIndexEmbeddings(),
+        label_dictionary=label_dictionary,
+        label_type="relation",
+        entity_label_type="ner",
+        **kwargs,
+    )
+
+
+def make_sentence() -> Sentence:
+    sentence = Sentence(["Bob", "was", "born", "in", "Paris", "and", "works", "at", "Google", "."])
+    sentence[0:1].add_label("ner", "PER")
+    sentence[4:5].add_label("ner", "LOC")
+    sentence[8:9].add_label("ner", "ORG")
+    Relation(sentence[0:1], sentence[4:5]).add_label("relation", "born_in")
+    return sentence
+
+
+def find_relation(relations: List[Relation], first: int, second: int) -> Relation:
+    return next(r for r in relations if r.first.tokens[0].idx == first + 1 and r.second.tokens[0].idx == second + 1)
+
+
+def test_relation_candidates_are_cached():
+    model = make_relation_extractor()
+    model.eval()
+    sentence = make_sentence()
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 6
+
+    cached_candidates = model._get_prediction_data_points([sentence])
+    assert len(cached_candidates) == 6
+    assert all(cached is candidate for cached, candidate in zip(cached_candidates, candidates))
+
+
+def test_relation_candidates_follow_entity_changes():
+    model = make_relation_extractor(entity_pair_filters=[("PER", "ORG")])
+    model.eval()
+    sentence = make_sentence()
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 1
+
+    # a new entity adds new candidate pairs
+    sentence[6:7].add_label("ner", "ORG")
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 2
+
+    # a changed tag removes the pairs that no longer pass the filter
+    sentence[8:9].set_label("ner", "LOC")
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 1
+    assert find_relation(candidates, 0, 6).second.text == "works"
+
+
+def test_relation_candidates_follow_gold_relations():
+    model = make_relation_extractor(train_on_gold_pairs_only=True)
+    model.train()
+    sentence = make_sentence()
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 1
+
+    Relation(sentence[0:1], sentence[8:9]).add_label("relation", "lives_in")
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 2
+    assert find_relation(candidates, 0, 8).get_label("relation").value == "lives_in"
+
+
+def test_gold_relation_candidates_follow_reannotated_entities():
+    model = make_relation_extractor(train_on_gold_pairs_only=True)
+    model.train()
+    sentence = make_sentence()
+
+    assert len(model._get_prediction_data_points([sentence])) == 1
+
+    # re-annotate the entities, as a tagger predicting into the entity label type does
+    sentence.remove_labels("ner")
+    sentence[0:1].add_label("ner", "PER")
+    sentence[4:5].add_label("ner", "LOC")
+    sentence[8:9].add_label("ner", "ORG")
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert len(candidates) == 1
+    assert candidates[0].get_label("relation").value == "born_in"
+
+    # the result does not depend on whether candidates were cached before the re-annotation
+    other_sentence = make_sentence()
+    other_sentence.remove_labels("ner")
+    other_sentence[0:1].add_label("ner", "PER")
+    other_sentence[4:5].add_label("ner", "LOC")
+
+    candidates = model._get_prediction_data_points([other_sentence])
+    assert len(candidates) == 1
+    assert candidates[0].get_label("relation").value == "born_in"
+
+
+def test_relation_candidates_follow_reannotation():
+    model = make_relation_extractor()
+    model.train()
+    sentence = make_sentence()
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert find_relation(candidates, 0, 4).get_label("relation").value == "born_in"
+
+    sentence.remove_labels("relation")
+    Relation(sentence[0:1], sentence[4:5]).add_label("relation", "lives_in")
+
+    candidates = model._get_prediction_data_points([sentence])
+    assert find_relation(candidates, 0, 4).get_label("relation").value == "lives_in"
+    assert model._prepare_label_tensor(candidates).tolist().count(model.label_dictionary.get_idx_for_item("O")) == 5
+
+
+def test_relation_predictions_after_removing_labels():
+    model = make_relation_extractor()
+    sentence = make_sentence()
+
+    model.predict(sentence, label_name="pred", return_probabilities_for_all_classes=True)
+    sentence.remove_labels("pred")
+    model.predict(sentence, label_name="pred", return_probabilities_for_all_classes=True)
+
+    assert len(Relation(sentence[0:1], sentence[8:9]).get_labels("pred")) == 2
+
+
+def test_relation_embeddings_are_gathered_from_boundary_tokens():
+    model = make_relation_extractor()
+    model.eval()
+    sentences = [make_sentence(), make_sentence()]
+    sentences[1][2:4].add_label("ner", "MISC")
+
+    candidates = model._get_prediction_data_points(sentences)
+    (embedded_entity_pairs,) = model._prepare_tensors(sentences)
+
+    expected = torch.stack([model._embed_prediction_data_point(relation) for relation in candidates])
+    assert torch.equal(embedded_entity_pairs, expected)
+    assert embedded_entity_pairs[0].tolist() == [1.0] * 3 + [1.0] * 3 + [5.0] * 3 + [5.0] * 3
+
+
+def test_forward_matches_dropout_on_unsqueezed_embeddings():
+    model = make_relation_extractor(locked_dropout=0.3, word_dropout=0.3)
+    model.train()
+    embedded_entity_pairs = torch.rand(5, model.final_embedding_size)
+
+    torch.manual_seed(1)
+    scores = model.forward(embedded_entity_pairs)
+
+    # previously, locked and word dropout were applied with an added singleton dimension (dropout itself is 0.0)
+    torch.manual_seed(1)
+    emb = embedded_entity_pairs.unsqueeze(1)
+    emb = model.locked_dropout(emb)
+    emb = model.word_dropout(emb)
+    expected_scores = model.decoder(emb.squeeze(1))
+
+    assert torch.equal(scores, expected_scores)